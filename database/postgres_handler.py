@@ -1,27 +1,43 @@
 # File: database/postgres_handler.py
 
+import threading
+
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json, execute_values
 from psycopg2 import pool
 from datetime import datetime
 
 class PostgresHandler:
     _pool = None
+    _schema_ready = False
+    _init_lock = threading.Lock()
 
     def __init__(self, conn_params=None):
-        if PostgresHandler._pool is None:
-            if conn_params is None:
-                conn_params = {
-                    'host':     'localhost',
-                    'port':     5432,
-                    'database': 'autograder_db',
-                    'user':     'vedant',
-                    'password': 'vedant'
-                }
-            PostgresHandler._pool = psycopg2.pool.SimpleConnectionPool(1, 20, **conn_params)
-        
-        self.conn = None
-        self.initialize_schema()
+        # The checked-out connection is per thread, so one handler can be shared by all sessions.
+        self._local = threading.local()
+        with PostgresHandler._init_lock:
+            if PostgresHandler._pool is None:
+                if conn_params is None:
+                    conn_params = {
+                        'host':     'localhost',
+                        'port':     5432,
+                        'database': 'autograder_db',
+                        'user':     'vedant',
+                        'password': 'vedant'
+                    }
+                PostgresHandler._pool = psycopg2.pool.ThreadedConnectionPool(2, 16, **conn_params)
+            # DDL only needs to run once per process, not on every handler.
+            if not PostgresHandler._schema_ready:
+                self.initialize_schema()
+                PostgresHandler._schema_ready = True
+
+    @property
+    def conn(self):
+        return getattr(self._local, 'conn', None)
+
+    @conn.setter
+    def conn(self, value):
+        self._local.conn = value
 
     def connect(self):
         if self.conn is None or getattr(self.conn, 'closed', True):
@@ -68,9 +84,40 @@ class PostgresHandler:
                         END IF;
                     END $$;
                 """)
+                cur.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key CHAR(64) PRIMARY KEY,
+                    result JSONB NOT NULL,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                );""")
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_gr_prof_assign ON grading_results (professor_id, assignment_no);")
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_gr_student_id ON grading_results (student_id);")
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_gc_editor_assign ON grading_corrections (editor_id, assignment_no);")
+                # Training-data export: corrected rows, then one prof_data lookup per row.
+                cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_gr_corrected ON grading_results (course, assignment_no, question)
+                    WHERE new_feedback IS NOT NULL AND new_feedback <> '' AND new_feedback <> old_feedback;""")
+                cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_gr_corrected_created ON grading_results (created_at)
+                    WHERE new_feedback IS NOT NULL AND new_feedback <> '' AND new_feedback <> old_feedback;""")
+                cur.execute("""
+                    DO $$
+                    BEGIN
+                        IF to_regclass('prof_data') IS NOT NULL THEN
+                            CREATE INDEX IF NOT EXISTS idx_pd_course_assign_q ON prof_data (course, assignment_no, question);
+                        END IF;
+                    END $$;
+                """)
+                # Lenient text -> jsonb cast (NULL on malformed input) so one bad row can't abort an export.
+                cur.execute("""
+                    CREATE OR REPLACE FUNCTION try_jsonb(t TEXT) RETURNS JSONB AS $$
+                    BEGIN
+                        RETURN t::jsonb;
+                    EXCEPTION WHEN others THEN
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql IMMUTABLE;
+                """)
             self.conn.commit()
         finally:
             self.close()
@@ -118,6 +165,52 @@ class PostgresHandler:
         finally:
             self.close()
 
+    def copy_lines_to(self, query: str, params: tuple, out) -> None:
+        """Writes the single text column of query into the binary file-like out, one raw line
+        per row, with COPY ... TO STDOUT instead of fetching rows through a cursor."""
+        self.connect()
+        try:
+            with self.conn.cursor() as cur:
+                select = cur.mogrify(query.strip().rstrip(";"), params).decode()
+                # CSV with control-character quote/delimiter: nothing gets quoted or escaped.
+                cur.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')", out)
+            self.conn.rollback()
+        finally:
+            self.close()
+
+    def bulk_insert_or_update_grading_results(self, rows: list) -> list:
+        """Upserts many grading results (dicts with the insert_or_update_grading_result fields)
+        in a single statement; returns the row ids in input order."""
+        if not rows: return []
+        cols = ("student_id", "professor_id", "course", "semester", "assignment_no", "question", "student_answer",
+                "language", "old_score", "new_score", "old_feedback", "new_feedback")
+        # ON CONFLICT cannot touch the same row twice in one statement, so the last row per key wins.
+        # Key parts are VARCHAR columns and come back as str, so normalize them for matching.
+        def key(r): return (str(r["student_id"]), str(r["assignment_no"]), str(r["question"]))
+        unique = {key(r): r for r in rows}
+        now = datetime.now()
+        self.connect()
+        try:
+            with self.conn.cursor() as cur:
+                sql = f'''
+                INSERT INTO grading_results ({", ".join(cols)}, created_at)
+                VALUES %s
+                ON CONFLICT (student_id, assignment_no, question) DO UPDATE
+                    SET new_score = EXCLUDED.new_score, new_feedback = EXCLUDED.new_feedback, student_answer = EXCLUDED.student_answer,
+                        language = EXCLUDED.language, course = EXCLUDED.course, semester = EXCLUDED.semester, professor_id = EXCLUDED.professor_id
+                RETURNING id, student_id, assignment_no, question;
+                '''
+                returned = execute_values(cur, sql, [tuple(r[c] for c in cols) + (now,) for r in unique.values()],
+                                          page_size=500, fetch=True)
+            self.conn.commit()
+        except Exception:
+            if self.conn: self.conn.rollback()
+            raise
+        finally:
+            self.close()
+        ids = {(sid, ano, q): rid for rid, sid, ano, q in returned}
+        return [ids[key(r)] for r in rows]
+
     def insert_grading_result(self, *args, **kwargs) -> int:
         return self.insert_or_update_grading_result(*args, **kwargs)
 
@@ -179,6 +272,32 @@ class PostgresHandler:
         finally:
             self.close()
 
+    def fetch_cached_grades(self, keys: list) -> dict:
+        """Returns {key: result} for the LLM grading results already cached under the given content hashes."""
+        if not keys: return {}
+        self.connect()
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT key, result FROM llm_cache WHERE key = ANY(%s);", (list(keys),))
+                return {key: result for key, result in cur.fetchall()}
+        finally:
+            self.close()
+
+    def store_cached_grades(self, results: dict) -> None:
+        """Caches {key: result} LLM grading results; existing keys are left untouched."""
+        if not results: return
+        self.connect()
+        try:
+            with self.conn.cursor() as cur:
+                execute_values(cur, "INSERT INTO llm_cache (key, result) VALUES %s ON CONFLICT (key) DO NOTHING;",
+                               [(key, Json(result)) for key, result in results.items()])
+            self.conn.commit()
+        except Exception:
+            if self.conn: self.conn.rollback()
+            raise
+        finally:
+            self.close()
+
     def fetch_results(self, filters: dict = None) -> list:
         self.connect()
         try:
@@ -279,3 +398,14 @@ class PostgresHandler:
             return shares
         finally:
             self.close()
+
+
+_shared_handler = None
+
+
+def get_handler() -> PostgresHandler:
+    """Process-wide PostgresHandler; use this instead of constructing one per page run."""
+    global _shared_handler
+    if _shared_handler is None:
+        _shared_handler = PostgresHandler()
+    return _shared_handler
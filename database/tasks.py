@@ -0,0 +1,18 @@
+# File: database/tasks.py
+"""
+Runs blocking database writes on a small background worker pool so the
+Streamlit script thread can keep rendering while Postgres round-trips finish.
+Each call returns a concurrent.futures.Future; call .result() where the
+outcome is actually needed.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from database.postgres_handler import get_handler
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-writer")
+
+
+def share_result_async(owner_email: str, target_email: str, result_id: int) -> Future:
+    """Queue a share_result call."""
+    # The shared handler checks out a pooled connection per thread, so workers can use it directly.
+    return _EXECUTOR.submit(lambda: get_handler().share_result(owner_email, target_email, result_id))
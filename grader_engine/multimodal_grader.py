@@ -6,6 +6,7 @@
 import os
 import json
 import re
+import asyncio
 from typing import List, Dict, Any
 import requests # Using requests to call the local Ollama API
 
@@ -16,6 +17,8 @@ from langchain.output_parsers import StructuredOutputParser, ResponseSchema
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
 OLLAMA_ENDPOINT = f"{OLLAMA_HOST}/api/generate"
+# Max grading requests in flight at once; keep in line with the server's OLLAMA_NUM_PARALLEL.
+OLLAMA_CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY", "4"))
 
 # ----------------------------------------------------------------------------
 # LLM OUTPUT SCHEMA
@@ -122,19 +125,21 @@ def grade_answer_multimodal(
         
     except (requests.RequestException, json.JSONDecodeError) as e:
         error_message = f"Grading failed: Could not connect to Ollama at {OLLAMA_ENDPOINT}. Is it running? Error: {e}"
-        out = {"total_score": 0, "rubric_scores": [{"criteria": r.get("criteria", ""), "score": 0} for r in rubric], "feedback": error_message}
+        out = {"total_score": 0, "rubric_scores": [{"criteria": r.get("criteria", ""), "score": 0} for r in rubric], "feedback": error_message, "error": str(e)}
         if return_debug:
             out["debug"] = {"model": OLLAMA_MODEL, "prompt": full_prompt_with_data, "raw_output": str(e)}
         return out
 
     # --- Parse the response ---
     parsed = {}
+    parse_error = None
     try:
         # Ollama with format='json' should return valid JSON, but we parse it safely.
         parsed = json.loads(_extract_json(raw_output))
-    except (json.JSONDecodeError, TypeError):
+    except (json.JSONDecodeError, TypeError) as e:
         # Fallback if the output is not clean JSON
         parsed = {}
+        parse_error = f"Could not parse model output as JSON: {e}"
 
     # Basic alignment and clamping
     aligned_scores = []
@@ -155,7 +160,18 @@ def grade_answer_multimodal(
         "rubric_scores": aligned_scores,
         "feedback": parsed.get("feedback", "")
     }
+    if parse_error:
+        # Flag the zero-score fallback so callers don't persist it as a real grade.
+        result["error"] = parse_error
     if return_debug:
         result["debug"] = {"model": OLLAMA_MODEL, "prompt": full_prompt_with_data, "raw_output": raw_output}
         
     return result
+
+
+async def grade_answer_multimodal_async(*args, **kwargs) -> Dict[str, Any]:
+    '''
+    Async variant of grade_answer_multimodal. The blocking Ollama request runs in a
+    worker thread, so callers can await many answers concurrently.
+    '''
+    return await asyncio.to_thread(grade_answer_multimodal, *args, **kwargs)
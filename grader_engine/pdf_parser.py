@@ -12,9 +12,10 @@ def extract_text_from_pdf(pdf_file: io.BytesIO) -> str:
         pdf_file.seek(0)
         # Open the PDF from a byte stream
         doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        text = "\n".join(page.get_text("text") for page in doc)
-        doc.close()
-        return text
+        try:
+            return "\n".join(doc.load_page(pno).get_text("text") for pno in range(doc.page_count))
+        finally:
+            doc.close()
     except Exception as e:
         print(f"Error extracting text from PDF with fitz: {e}")
         return ""
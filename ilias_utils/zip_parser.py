@@ -7,6 +7,7 @@ import json
 import zipfile
 import mimetypes
 import io
+import shutil
 import concurrent.futures
 from typing import Optional, Tuple, List, Iterable, Dict, Union, Any
 
@@ -202,8 +203,6 @@ def parse_ilias_zip(zip_path_or_file: Union[str, io.BytesIO], multimodal_extract
 
 
 def parse_ilias_assignment_zip_strict(zip_path: str) -> IngestResult:
-    # This function can also be parallelized in a similar manner, 
-    # but for now, we focus on the main one.
     if not os.path.isfile(zip_path): raise FileNotFoundError(zip_path)
     if not zip_path.lower().endswith(".zip"): raise ValueError("Expected a .zip ILIAS export")
     with zipfile.ZipFile(zip_path, "r") as z:
@@ -233,6 +232,7 @@ def parse_ilias_assignment_zip_strict(zip_path: str) -> IngestResult:
                     rel = a[len(subdir):]
                     if "/" in rel: student_dirs.add(rel.split("/", 1)[0])
         if not student_dirs: raise ValueError(f"No student folders found under '{subdir}'")
+        pdf_processing_tasks: Dict[str, StudentFile] = {}
         for info in z.infolist():
             arc = info.filename.replace("\\", "/")
             if not arc.startswith(subdir) or arc.endswith("/"): continue
@@ -242,15 +242,20 @@ def parse_ilias_assignment_zip_strict(zip_path: str) -> IngestResult:
             if sdir not in student_dirs: continue
             st = ensure_student(sdir)
             fname = os.path.basename(tail)
-            extracted_content = []
+            student_file = StudentFile(arcname=arc, filename=fname, size=info.file_size, content_type=_guess_mime(fname), multimodal_content=[])
+            st.files.append(student_file)
             if fname.lower().endswith('.pdf'):
-                try:
-                    with z.open(arc) as pdf_file:
-                        pdf_bytes = pdf_file.read()
-                        extracted_content = extract_multimodal_content_from_pdf(io.BytesIO(pdf_bytes))
-                except Exception as e:
-                    print(f"Error processing PDF {arc}: {e}")
-            st.files.append(StudentFile(arcname=arc, filename=fname, size=info.file_size, content_type=_guess_mime(fname), multimodal_content=extracted_content))
+                pdf_processing_tasks[info.filename] = student_file
+
+        # Same parallel extraction as parse_ilias_zip; ZipFile reads are serialized internally.
+        if pdf_processing_tasks:
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                future_to_student_file = {
+                    executor.submit(_process_pdf_content, z, arc_name, extract_multimodal_content_from_pdf): student_file
+                    for arc_name, student_file in pdf_processing_tasks.items()
+                }
+                for future in concurrent.futures.as_completed(future_to_student_file):
+                    future_to_student_file[future].multimodal_content = future.result()
         assignment_name = os.path.splitext(os.path.basename(zip_path))[0]
         return IngestResult(assignment_name=assignment_name, excel_path=excel_candidate, student_folders=list(student_map.values()))
 
@@ -293,6 +298,6 @@ def extract_student_files(zip_path: str, dest_dir: str, only_students: Optional[
             os.makedirs(os.path.dirname(target), exist_ok=True)
             if not info.is_dir():
                 with z.open(info, "r") as src, open(target, "wb") as dst:
-                    dst.write(src.read())
+                    shutil.copyfileobj(src, dst, 1 << 20)
                     count += 1
     return count
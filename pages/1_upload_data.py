@@ -1,5 +1,6 @@
 
 import streamlit as st
+import hashlib
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
@@ -19,6 +20,26 @@ if "logged_in_prof" not in st.session_state:
     st.stop()
 prof = st.session_state["logged_in_prof"]
 
+# --- CACHED EXTRACTION ---
+# Re-running "Start Grading" with the same uploads skips PDF/ZIP parsing.
+# The uploads are passed as underscore args (not hashed by Streamlit); the digest is the key.
+# UploadedFile is already an in-memory file, so it is handed over as-is instead of copied.
+# Results include extracted image bytes and are shared process-wide, so entries are few and
+# expire after EXTRACTION_CACHE_TTL; the cache only has to cover retries of the same upload.
+EXTRACTION_CACHE_TTL = 600  # seconds
+
+@st.cache_data(show_spinner=False, max_entries=16, ttl=EXTRACTION_CACHE_TTL)
+def extract_pdf_blocks_cached(digest: str, _pdf_file: BytesIO) -> List[Dict[str, Any]]:
+    return extract_multimodal_content_from_pdf(_pdf_file)
+
+@st.cache_data(show_spinner=False, max_entries=2, ttl=EXTRACTION_CACHE_TTL)
+def parse_ilias_zip_cached(digest: str, _zip_file: BytesIO) -> IngestResult:
+    _zip_file.seek(0)
+    return parse_ilias_zip(_zip_file, multimodal_extractor=extract_multimodal_content_from_pdf)
+
+def _digest(upload: BytesIO) -> str:
+    return hashlib.sha1(upload.getbuffer()).hexdigest()
+
 # --- PROFESSOR PDF PARSING ---
 def parse_professor_pdf(text: str) -> Dict:
     prof_info = {}
@@ -132,8 +153,7 @@ if st.button("🚦 Start Grading", disabled=not (prof_pdf and submission_file),
 
     try:
         with st.spinner("Processing Professor PDF..."):
-            pdf_bytes = prof_pdf.getvalue()
-            prof_content_blocks = extract_multimodal_content_from_pdf(BytesIO(pdf_bytes))
+            prof_content_blocks = extract_pdf_blocks_cached(_digest(prof_pdf), prof_pdf)
             prof_text = "\n".join([b['content'] for b in prof_content_blocks if b['type'] == 'text'])
             prof_info = parse_professor_pdf(prof_text)
             if not prof_info.get("questions"): st.error("Professor PDF missing Q1:, etc."); st.stop()
@@ -153,10 +173,7 @@ if st.button("🚦 Start Grading", disabled=not (prof_pdf and submission_file),
         with st.spinner(f"Processing student submissions..."):
             if submission_file.name.lower().endswith(".zip"):
                 st.session_state["upload_type"] = "ilias_zip"
-                ingest_result: IngestResult = parse_ilias_zip(
-                    BytesIO(submission_file.getvalue()),
-                    multimodal_extractor=extract_multimodal_content_from_pdf
-                )
+                ingest_result: IngestResult = parse_ilias_zip_cached(_digest(submission_file), submission_file)
                 st.session_state["ilias_ingest_result"] = ingest_result
                 for student_folder in ingest_result.student_folders:
                     student_id = student_folder.email or student_folder.raw_folder
@@ -164,7 +181,7 @@ if st.button("🚦 Start Grading", disabled=not (prof_pdf and submission_file),
                     students_data[student_id] = process_student_data(all_student_blocks)
             else: # PDF
                 st.session_state["upload_type"] = "pdf"
-                all_content_blocks = extract_multimodal_content_from_pdf(BytesIO(submission_file.getvalue()))
+                all_content_blocks = extract_pdf_blocks_cached(_digest(submission_file), submission_file)
                 students_data["Student 1"] = process_student_data(all_content_blocks)
 
         qids = [q["id"] for q in prof_info.get("questions", [])]
@@ -3,14 +3,17 @@
 import streamlit as st
 st.set_page_config(page_title="⚖️ Grading Results", layout="wide")
 
-import pandas as pd
-import json, re, difflib, hashlib, io, zipfile, time
-from typing import List, Dict, Any
+import numpy as np
+import re, hashlib, io, zipfile, time, asyncio
+import orjson
+from typing import TYPE_CHECKING, List, Dict, Any
 from PIL import Image
+if TYPE_CHECKING: import pandas as pd  # imported lazily in _summary_table at runtime
 
-from database.postgres_handler import PostgresHandler
-from grader_engine.multimodal_grader import grade_answer_multimodal as grade_answer
+from database.postgres_handler import PostgresHandler, get_handler
+from grader_engine.multimodal_grader import grade_answer_multimodal_async as grade_answer_async, OLLAMA_CONCURRENCY, OLLAMA_MODEL, PROMPT_TEXT
 from grader_engine.code_grader import grade_code
+from utils.grading import align_to_rubric, dedupe_feedback, bytes_default, item_signature
 from grader_engine.multimodal_rag import retrieve_multimodal_context
 from ilias_utils.zip_parser import IngestResult
 from ilias_utils.pdf_feedback import FeedbackPDFGenerator
@@ -114,7 +117,23 @@ TRANSLATIONS = {
     }
 }
 
+UI_REFRESH_SECONDS = 0.25  # each status/progress update is a websocket round-trip; cap the rate
+# Part of every llm_cache key. Prompt edits invalidate the cache automatically; bump the
+# version when grading or alignment logic changes in a way the prompt hash can't see.
+GRADER_CACHE_VERSION = 1
+_PROMPT_HASH = hashlib.sha256(PROMPT_TEXT.encode()).hexdigest()
+_GRADER_KEY = {"grader": [GRADER_CACHE_VERSION, _PROMPT_HASH], "model": OLLAMA_MODEL}
+
 # ---- HELPERS ----
+@st.cache_data(show_spinner=False, max_entries=256)
+def _image_preview(content: bytes, max_side: int = 800) -> bytes:
+    """Downsized PNG of an answer image; cached so reruns don't re-decode the original."""
+    img = Image.open(io.BytesIO(content))
+    img.thumbnail((max_side, max_side))
+    if img.mode not in ("RGB", "RGBA", "L", "LA", "P"): img = img.convert("RGB")
+    buf = io.BytesIO(); img.save(buf, format="PNG")
+    return buf.getvalue()
+
 def render_content_blocks(title: str, content_blocks: List[Dict[str, Any]]):
     st.markdown(f"**{title}**")
     if not content_blocks:
@@ -126,61 +145,157 @@ def render_content_blocks(title: str, content_blocks: List[Dict[str, Any]]):
         if content_type == 'text':
             st.text_area("Text", value=content, height=max(100, len(content)//3), disabled=True, label_visibility="collapsed")
         elif content_type == 'image':
-            try: st.image(Image.open(io.BytesIO(content)), use_column_width=True)
+            try: st.image(_image_preview(content), use_column_width=True)
             except Exception as e: st.warning(f"Could not display image: {e}")
 
-def _normalize_criteria(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip().lower())
-
-def _align_to_rubric(rubric_list: List[Dict], model_breakdown: List[Dict], model_total: int, fuzzy_cutoff: float=0.6) -> List[Dict]:
-    if not rubric_list: return []
-    mm, keys = {}, []
-    for it in (model_breakdown or []):
-        k = _normalize_criteria(it.get("criteria", ""))
-        try: sc = int(round(float(it.get("score", 0))))
-        except (ValueError, TypeError): sc = 0
-        if k: mm[k]=sc; keys.append(k)
-    aligned = []
-    for r in rubric_list:
-        crit, pts = r.get("criteria", ""), int(r.get("points", 0)); norm = _normalize_criteria(crit)
-        if norm in mm: sc = mm[norm]
-        else:
-            close = difflib.get_close_matches(norm, keys, n=1, cutoff=fuzzy_cutoff)
-            sc = mm.get(close[0], 0) if close else 0
-        aligned.append({"criteria": crit, "score": max(0, min(sc, pts))})
-    return aligned
-
 def _total_possible(rubric_list: List[Dict]) -> int:
     return sum(int(r.get("points", 0)) for r in rubric_list)
 
-def _dedupe_feedback(text: str) -> str:
-    lines = [l.strip() for l in re.split(r'[\n]+', text or "") if l.strip()]
-    seen, out = set(), []
-    for ln in lines:
-        key = re.sub(r'\W+', ' ', ln.lower()).strip()
-        if key not in seen: out.append(ln); seen.add(key)
-    return "\n".join(out)
-
-def _make_serializable(data: Any) -> Any:
-    if isinstance(data, dict): return {k: _make_serializable(v) for k, v in data.items()}
-    if isinstance(data, list): return [_make_serializable(v) for v in data]
-    if isinstance(data, bytes): return f"<bytes_hash:{hashlib.sha256(data).hexdigest()}>"
-    return data
-
 def _signature(prof_data: Dict, students_data: Dict, language: str) -> str:
-    payload = json.dumps({"prof": prof_data, "students": _make_serializable(students_data), "lang": language}, sort_keys=True)
-    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    # Session-scoped inputs are replaced, not mutated, on re-upload, so identity is enough to reuse the last hash.
+    memo = st.session_state.get("_signature_memo")
+    if memo and memo[0] is prof_data and memo[1] is students_data and memo[2] == language: return memo[3]
+    # Hash key by key / student by student instead of serializing the whole payload at once.
+    h = hashlib.sha256()
+    for part in (prof_data, students_data):
+        for k in sorted(part):
+            h.update(str(k).encode()); h.update(orjson.dumps(part[k], default=bytes_default, option=orjson.OPT_SORT_KEYS))
+        h.update(b"\0")
+    h.update(language.encode())
+    sig = h.hexdigest()
+    st.session_state["_signature_memo"] = (prof_data, students_data, language, sig)
+    return sig
+
+def _code_feedback(details: Dict[str, Any], T: Dict[str, str]) -> str:
+    reason = details.get("reason", "N/A")
+    if reason == "tests":
+        feedback_parts = [T["code_feedback_tests"].format(passed=details.get('passed', 0), total=details.get('total', 0))]
+        if details.get("failures"):
+            feedback_parts.append(T["code_feedback_failures_header"])
+            for failure in details["failures"][:3]: # Limit to 3 failures
+                feedback_parts.append(T["code_feedback_failure_item"].format(
+                    input=failure.get('input','N/A'),
+                    expected=failure.get('expected','N/A'),
+                    got=failure.get('got','N/A')))
+        return "\n".join(feedback_parts)
+    if reason == "blank":
+        return T["code_feedback_blank"]
+    if reason == "no_tests_and_bad_code":
+        return T["code_feedback_invalid"]
+    if "syntax_ok" in reason:
+        return T["code_feedback_runtime_error"].format(error=details.get('stderr', 'Unknown issue'))
+    return T["code_feedback_generic_fail"].format(reason=reason)
+
+async def _grade_llm_jobs(jobs: List[Dict[str, Any]], language: str, on_graded) -> None:
+    """Grade queued answers concurrently, at most OLLAMA_CONCURRENCY in flight.
+    on_graded(job, out) runs on the script thread as each answer completes."""
+    if not jobs: return
+    sem = asyncio.Semaphore(OLLAMA_CONCURRENCY)
+
+    async def run(job):
+        async with sem:
+            q = job["q"]
+            out = await grade_answer_async(question=q["question"], ideal_answer=q["ideal_answer"], rubric=q.get("rubric", []), student_answer_blocks=job["answer"], multimodal_context=job["context"], language=language, return_debug=True)
+            return job, out
+
+    for next_done in asyncio.as_completed([run(job) for job in jobs]):
+        job, out = await next_done
+        on_graded(job, out)
+
+def _score_matrix(grading_results: Dict, student_ids: List[str], question_ids: List[str]) -> Dict[str, Any]:
+    """Dense (students x questions x criteria) int32 copy of the rubric scores so totals are one vectorized sum."""
+    width = max((len(grading_results[f"{s}_{q}"]["rubric_scores"]) for s in student_ids for q in question_ids), default=0)
+    scores = np.zeros((len(student_ids), len(question_ids), width), dtype=np.int32)
+    for si, s in enumerate(student_ids):
+        for qi, q in enumerate(question_ids):
+            for ri, it in enumerate(grading_results[f"{s}_{q}"]["rubric_scores"]):
+                scores[si, qi, ri] = int(it["score"])
+    return {"scores": scores, "student_index": {s: i for i, s in enumerate(student_ids)}, "question_index": {q: i for i, q in enumerate(question_ids)}}
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _summary_table(scores: np.ndarray, student_ids: tuple, question_ids: tuple, possible: tuple) -> "pd.DataFrame":
+    """'score/possible' cell per student and question plus a Total column; keyed on the score matrix contents."""
+    import pandas as pd  # only needed once results exist
+    totals = pd.DataFrame(scores.sum(axis=2), index=pd.Index(student_ids, name="Student"), columns=list(question_ids))
+    table = totals.astype(str) + "/" + pd.Series(possible, index=list(question_ids)).astype(str)
+    table["Total"] = totals.sum(axis=1).astype(str) + f"/{sum(possible)}"
+    return table
 
 def update_score_callback(student, q_id, rubric_idx, slider_key):
     if slider_key in st.session_state:
-        st.session_state["grading_cache"]['results'][f"{student}_{q_id}"]['rubric_scores'][rubric_idx]['score'] = st.session_state[slider_key]
+        cache, value = st.session_state["grading_cache"], st.session_state[slider_key]
+        cache['results'][f"{student}_{q_id}"]['rubric_scores'][rubric_idx]['score'] = value
+        if "scores" in cache:
+            cache["scores"][cache["student_index"][student], cache["question_index"][q_id], rubric_idx] = value
+
+def update_feedback_callback(detail_key, fb_key):
+    if fb_key in st.session_state:
+        stored = st.session_state["grading_cache"]['results'][detail_key]
+        stored["feedback"]["text"] = dedupe_feedback(st.session_state[fb_key])
+
+def _invalidate_dashboard():
+    """Drop the dashboard's cached results frame; other st.cache_data caches are unaffected."""
+    from utils.dashboard_data import load_dashboard_df  # pulls in pandas, so only on writes
+    load_dashboard_df.clear()
+
+@st.fragment
+def _detail_view(grading_results: Dict, students_data: Dict, prof_data: Dict, T: Dict, db: PostgresHandler, my_email: str):
+    """Detail/edit panel; runs as a fragment so slider and feedback edits only rerun this panel."""
+    st.subheader(T["detailed_view"])
+    sel_st = st.selectbox("Select Student", list(students_data.keys()))
+    sel_q = st.selectbox("Select Question", [q['id'] for q in prof_data["questions"]])
+    detail_key = f"{sel_st}_{sel_q}"
+    stored = grading_results[detail_key]
+    if st.session_state.pop("_saved_detail", None) == detail_key: st.success("✅ Changes saved!")
+
+    st.markdown(f"**{T['question']}:** {stored['question']}")
+    render_content_blocks(T['student_answer'], stored.get('student_answer_content', []))
+    with st.expander(T["retrieved_context_title"]):
+        render_content_blocks("Context", stored.get("multimodal_context_items", []))
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown(T["rubric_breakdown"])
+        for idx, crit in enumerate(stored["rubric_list"]):
+            init_score = int(stored["rubric_scores"][idx]["score"])
+            max_pts = int(crit.get("points", 0)); slider_key = f"slider_{detail_key}_{idx}"
+            st.slider(f'{crit["criteria"]} (Points: {max_pts})', 0, max_pts, init_score, key=slider_key, on_change=update_score_callback, args=(sel_st, sel_q, idx, slider_key))
+        total_now = sum(int(x["score"]) for x in stored["rubric_scores"])
+        st.info(f"**Total Score: {total_now} / {_total_possible(stored['rubric_list'])}**")
+
+    with c2:
+        st.markdown(T["feedback"])
+        fb_key = f"fb_{detail_key}"
+        st.text_area("Feedback", value=stored["feedback"]["text"], key=fb_key, height=300, label_visibility="collapsed",
+                     on_change=update_feedback_callback, args=(detail_key, fb_key))
+
+    if st.button(T["save_changes"], key=f"save_{detail_key}", type="primary"):
+        new_total_score = sum(item["score"] for item in stored["rubric_scores"])
+        db.update_grading_result_with_correction(grading_result_id=stored['db_id'], new_score=new_total_score, new_feedback=stored["feedback"]["text"], editor_id=my_email)
+        stored["feedback"]["original"] = stored["feedback"]["text"]
+        for item in stored["rubric_scores"]: item["original_score"] = item["score"]
+        _invalidate_dashboard()
+        # The summary table lives outside this fragment; rerun the whole page so its totals update.
+        st.session_state["_saved_detail"] = detail_key
+        st.rerun(scope="app")
+
+    with st.expander(T["share_expander"]):
+        share_email = st.text_input(T["share_email_input"], key=f"share_email_{detail_key}")
+        if st.button(T["share_button"], key=f"share_button_{detail_key}"):
+            if share_email and "@" in share_email:
+                try:
+                    db.share_result(owner_email=my_email, target_email=share_email, result_id=stored['db_id'])
+                    _invalidate_dashboard()
+                    st.success(T["share_success"])
+                except Exception as e: st.error(f"{T['share_error']} Error: {e}")
+            else: st.warning(T["invalid_email"])
 
 # ---- MAIN PAGE LOGIC ----
 def grading_result_page():
     if "logged_in_prof" not in st.session_state: st.warning("Please login first."); st.stop()
     prof = st.session_state["logged_in_prof"]; my_email = prof.get("university_email","")
 
-    try: db = PostgresHandler()
+    try: db = get_handler()
     except Exception as e: st.error(f"Database connection failed: {e}"); st.stop()
 
     prof_data = st.session_state.get("prof_data"); students_data = st.session_state.get("students_data")
@@ -192,154 +307,118 @@ def grading_result_page():
 
     sig = _signature(prof_data, students_data, language)
     if st.session_state.get("grading_cache", {}).get("signature") != sig:
-        grading_results = {}
+        grading_results, pending_rows, llm_jobs = {}, {}, []
         total_tasks = len(students_data) * len(prof_data["questions"])
         progress_bar = st.progress(0, text=f"Preparing to grade {total_tasks} answers...")
         tasks_done = 0
 
+        # Serialize every answer once up front instead of inside the per-question loop.
+        serialized_answers = {
+            (sid, ans_key): orjson.dumps(blocks, default=bytes_default).decode()
+            for sid, answers in students_data.items() for ans_key, blocks in answers.items()
+        }
+
+        def record(student_id, q, aligned, feedback_txt, llm_debug, stud_ans_content, ctx_items):
+            nonlocal tasks_done
+            key = f"{student_id}_{q['id']}"; ans_key = q["id"].replace("Q", "A")
+            total_score = sum(s['score'] for s in aligned)
+            pending_rows[key] = dict(student_id=student_id, professor_id=prof_data.get("professor", my_email), course=prof_data.get("course", ""), semester=prof_data.get("session", ""), assignment_no=prof_data.get("assignment_no", ""), question=q["question"], student_answer=serialized_answers.get((student_id, ans_key), "[]"), language=language, old_score=total_score, new_score=total_score, old_feedback=feedback_txt, new_feedback=feedback_txt)
+            grading_results[key] = {
+                "db_id": None,
+                "rubric_scores": [{"criteria": a["criteria"], "score": int(a["score"]), "original_score": int(a["score"])} for a in aligned],
+                "feedback": {"text": feedback_txt, "original": feedback_txt},
+                "llm_debug": llm_debug, "question": q["question"], "ideal_answer": q["ideal_answer"],
+                "rubric_list": q.get("rubric", []), "student_answer_content": stud_ans_content,
+                "multimodal_context_items": ctx_items
+            }
+            tasks_done += 1
+
         with st.status("Running AI grading...", expanded=True) as status:
-            for i, (student_id, student_answers) in enumerate(students_data.items()):
-                status.write(f"---**Processing student: {student_id}** ({i+1} of {len(students_data)})")
+            status_line, last_ui = status.empty(), 0.0
 
-                for j, q in enumerate(prof_data["questions"]):
-                    tasks_done += 1
+            def report(msg: str):
+                nonlocal last_ui
+                now = time.monotonic()
+                if now - last_ui >= UI_REFRESH_SECONDS or tasks_done == total_tasks:
+                    status_line.markdown(msg)
                     progress_bar.progress(tasks_done / total_tasks, text=f"Overall Progress: {tasks_done} of {total_tasks}")
-                    
-                    q_status_placeholder = status.empty()
-                    key = f"{student_id}_{q['id']}"; ans_key = q["id"].replace("Q", "A")
+                    last_ui = now
+
+            # Pass 1: blank and code answers are graded inline; language-model answers are queued.
+            for i, (student_id, student_answers) in enumerate(students_data.items()):
+                for j, q in enumerate(prof_data["questions"]):
+                    ans_key = q["id"].replace("Q", "A")
                     stud_ans_content = student_answers.get(ans_key, [])
                     rubric_list = q.get("rubric", [])
-                    
-                    aligned, feedback_txt, llm_debug, ctx_items = [], T["no_answer"], None, []
-
                     is_code_question = "tests" in q or any(kw in q['question'].lower() for kw in ['python', 'program', 'code', 'function'])
 
                     if not stud_ans_content:
-                        feedback_txt = T["no_answer"]
-                        aligned = [{"criteria": r["criteria"], "score": 0} for r in rubric_list]
-                    
+                        record(student_id, q, [{"criteria": r["criteria"], "score": 0} for r in rubric_list], T["no_answer"], None, stud_ans_content, [])
                     elif is_code_question:
-                        q_status_placeholder.text(f"  - Q{j+1}: 💻 Using specialized code grader...")
                         student_code = next((block.get('content', '') for block in stud_ans_content if block.get('type') == 'text'), '')
-                        tests = q.get('tests', [])
-                        
-                        total_award, rubric_breakdown, details = grade_code(student_code=student_code, tests=tests, rubric=rubric_list)
-                        aligned = rubric_breakdown
-                        
-                        reason = details.get("reason", "N/A")
-                        if reason == "tests":
-                            feedback_parts = [T["code_feedback_tests"].format(passed=details.get('passed', 0), total=details.get('total', 0))]
-                            if details.get("failures"):
-                                feedback_parts.append(T["code_feedback_failures_header"])
-                                for failure in details["failures"][:3]: # Limit to 3 failures
-                                    feedback_parts.append(T["code_feedback_failure_item"].format(
-                                        input=failure.get('input','N/A'),
-                                        expected=failure.get('expected','N/A'),
-                                        got=failure.get('got','N/A')))
-                            feedback_txt = "\n".join(feedback_parts)
-                        elif reason == "blank":
-                            feedback_txt = T["code_feedback_blank"]
-                        elif reason == "no_tests_and_bad_code":
-                            feedback_txt = T["code_feedback_invalid"]
-                        elif "syntax_ok" in reason:
-                            feedback_txt = T["code_feedback_runtime_error"].format(error=details.get('stderr', 'Unknown issue'))
-                        else:
-                            feedback_txt = T["code_feedback_generic_fail"].format(reason=reason)
-
-                        llm_debug = {"grader": "code_grader", "details": details}
-                    
-                    else: # Is NOT a code question -> use LLM
-                        q_status_placeholder.text(f"  - Q{j+1}: 🤖 Using language model grader...")
+                        total_award, rubric_breakdown, details = grade_code(student_code=student_code, tests=q.get('tests', []), rubric=rubric_list)
+                        record(student_id, q, rubric_breakdown, _code_feedback(details, T), {"grader": "code_grader", "details": details}, stud_ans_content, [])
+                    else:
                         ctx_items = retrieve_multimodal_context(q_id=q['id'], question=q['question'])['context']
-                        out = grade_answer(question=q["question"], ideal_answer=q["ideal_answer"], rubric=rubric_list, student_answer_blocks=stud_ans_content, multimodal_context=ctx_items, language=language, return_debug=True)
-                        aligned = _align_to_rubric(rubric_list, out.get("rubric_scores",[]), out.get("total_score"))
-                        feedback_txt = _dedupe_feedback(out.get("feedback", ""))
-                        llm_debug = out.get("debug")
-                    
-                    q_status_placeholder.text(f"  - Q{j+1}: 💾 Saving result...")
-                    student_answer_str = json.dumps(_make_serializable(stud_ans_content))
-                    total_score = sum(s['score'] for s in aligned)
+                        llm_jobs.append({"student_id": student_id, "q": q, "answer": stud_ans_content, "context": ctx_items})
+                        continue
+                    report(f"Student {i+1}/{len(students_data)} (**{student_id}**), Q{j+1}: 💻 graded")
+
+            # Pass 2: language-model answers run concurrently. Jobs are grouped by question so
+            # requests sharing the same question/rubric prompt prefix are dispatched back-to-back.
+            # Answers graded in an earlier session are served from the persistent llm_cache, and
+            # identical answers to the same question are graded once and fanned out.
+            if llm_jobs:
+                llm_jobs.sort(key=lambda job: job["q"]["id"])
+                for job in llm_jobs:
+                    job["cache_key"] = item_signature(job["q"], job["answer"], job["context"], language, _GRADER_KEY)
+                try: cached = db.fetch_cached_grades([job["cache_key"] for job in llm_jobs])
+                except Exception as e: st.warning(f"LLM result cache unavailable: {e}"); cached = {}
+                new_results = {}
+
+                def on_graded(job, out):
+                    q = job["q"]
+                    if job["cache_key"] not in cached and "error" not in out:
+                        new_results[job["cache_key"]] = {k: v for k, v in out.items() if k != "debug"}
+                    aligned = align_to_rubric(q.get("rubric", []), out.get("rubric_scores",[]), out.get("total_score"))
+                    record(job["student_id"], q, aligned, dedupe_feedback(out.get("feedback", "")), out.get("debug"), job["answer"], job["context"])
+                    report(f"🤖 **{job['student_id']}**, {q['id']}: graded by language model")
+
+                misses = {}
+                for job in llm_jobs:
+                    if job["cache_key"] in cached:
+                        on_graded(job, {**cached[job["cache_key"]], "debug": {"cache": "hit", "key": job["cache_key"]}})
+                    else: misses.setdefault(job["cache_key"], []).append(job)
+
+                def fan_out(job, out):
+                    for twin in misses[job["cache_key"]]: on_graded(twin, out)
+
+                asyncio.run(_grade_llm_jobs([group[0] for group in misses.values()], language, fan_out))
+
+                try: db.store_cached_grades(new_results)
+                except Exception as e: st.warning(f"Could not update LLM result cache: {e}")
+
+            # One batched upsert for the whole class instead of a round-trip per answer.
+            db_ids = db.bulk_insert_or_update_grading_results(list(pending_rows.values()))
+            for key, db_id in zip(pending_rows, db_ids):
+                grading_results[key]["db_id"] = db_id
 
-                    db_id = db.insert_or_update_grading_result(student_id=student_id, professor_id=prof_data.get("professor", my_email), course=prof_data.get("course", ""), semester=prof_data.get("session", ""), assignment_no=prof_data.get("assignment_no", ""), question=q["question"], student_answer=student_answer_str, language=language, old_score=total_score, new_score=total_score, old_feedback=feedback_txt, new_feedback=feedback_txt)
-                    
-                    grading_results[key] = {
-                        "db_id": db_id,
-                        "rubric_scores": [{"criteria": a["criteria"], "score": int(a["score"]), "original_score": int(a["score"])} for a in aligned],
-                        "feedback": {"text": feedback_txt, "original": feedback_txt},
-                        "llm_debug": llm_debug, "question": q["question"], "ideal_answer": q["ideal_answer"],
-                        "rubric_list": rubric_list, "student_answer_content": stud_ans_content,
-                        "multimodal_context_items": ctx_items
-                    }
-                    q_status_placeholder.text(f"  - Q{j+1}: ✅ Grading complete.")
-                    time.sleep(0.1)
-            
             status.update(label="✅ AI Grading Complete!", state="complete", expanded=False)
 
         st.session_state["grading_cache"] = {"signature": sig, "results": grading_results}
         progress_bar.empty()
         st.success("All answers have been graded and saved!")
 
-    grading_results = st.session_state["grading_cache"]['results']
+    cache = st.session_state["grading_cache"]
+    grading_results = cache['results']
+    if "scores" not in cache:
+        cache.update(_score_matrix(grading_results, list(students_data), [q["id"] for q in prof_data["questions"]]))
 
     st.subheader(T["results_summary"])
-    rows = []
-    for student in students_data:
-        tot_sc = tot_ps = 0
-        row = {"Student": student}
-        for q in prof_data["questions"]:
-            k = f"{student}_{q['id']}"
-            sc = sum(int(it["score"]) for it in grading_results[k]["rubric_scores"])
-            ps = _total_possible(q.get("rubric",[]))
-            row[q["id"]] = f"{sc}/{ps}"
-            tot_sc += sc
-            tot_ps += ps
-        row["Total"] = f"{tot_sc}/{tot_ps}"
-        rows.append(row)
-    st.table(pd.DataFrame(rows).set_index("Student"))
+    st.dataframe(_summary_table(cache["scores"], tuple(students_data), tuple(q["id"] for q in prof_data["questions"]),
+                                tuple(_total_possible(q.get("rubric",[])) for q in prof_data["questions"])))
 
-    st.subheader(T["detailed_view"])
-    sel_st = st.selectbox("Select Student", list(students_data.keys()))
-    sel_q = st.selectbox("Select Question", [q['id'] for q in prof_data["questions"]])
-    detail_key = f"{sel_st}_{sel_q}"
-    stored = grading_results[detail_key]
-
-    st.markdown(f"**{T['question']}:** {stored['question']}")
-    render_content_blocks(T['student_answer'], stored.get('student_answer_content', []))
-    with st.expander(T["retrieved_context_title"]):
-        render_content_blocks("Context", stored.get("multimodal_context_items", []))
-
-    c1, c2 = st.columns(2)
-    with c1:
-        st.markdown(T["rubric_breakdown"])
-        for idx, crit in enumerate(stored["rubric_list"]):
-            init_score = int(stored["rubric_scores"][idx]["score"])
-            max_pts = int(crit.get("points", 0)); slider_key = f"slider_{detail_key}_{idx}"
-            st.slider(f'{crit["criteria"]} (Points: {max_pts})', 0, max_pts, init_score, key=slider_key, on_change=update_score_callback, args=(sel_st, sel_q, idx, slider_key))
-        total_now = sum(int(x["score"]) for x in stored["rubric_scores"])
-        st.info(f"**Total Score: {total_now} / {_total_possible(stored['rubric_list'])}**")
-
-    with c2:
-        st.markdown(T["feedback"])
-        fb_key = f"fb_{detail_key}"
-        fb_text = st.text_area("Feedback", value=stored["feedback"]["text"], key=fb_key, height=300, label_visibility="collapsed")
-        stored["feedback"]["text"] = _dedupe_feedback(fb_text)
-
-    if st.button(T["save_changes"], key=f"save_{detail_key}", type="primary"):
-        new_total_score = sum(item["score"] for item in stored["rubric_scores"])
-        db.update_grading_result_with_correction(grading_result_id=stored['db_id'], new_score=new_total_score, new_feedback=stored["feedback"]["text"], editor_id=my_email)
-        stored["feedback"]["original"] = stored["feedback"]["text"]
-        for item in stored["rubric_scores"]: item["original_score"] = item["score"]
-        st.success("✅ Changes saved!")
-
-    with st.expander(T["share_expander"]):
-        share_email = st.text_input(T["share_email_input"], key=f"share_email_{detail_key}")
-        if st.button(T["share_button"], key=f"share_button_{detail_key}"):
-            if share_email and "@" in share_email:
-                try:
-                    db.share_result(owner_email=my_email, target_email=share_email, result_id=stored['db_id'])
-                    st.success(T["share_success"])
-                except Exception as e: st.error(f"{T['share_error']} Error: {e}")
-            else: st.warning(T["invalid_email"])
+    _detail_view(grading_results, students_data, prof_data, T, db, my_email)
 
     # --- ZIP EXPORT ---
     st.markdown("---")
@@ -2,7 +2,7 @@
 # File: pages/3_collaboration_center.py
 import streamlit as st
 import pandas as pd
-from database.postgres_handler import PostgresHandler
+from database.postgres_handler import get_handler
 
 # --- AUTH CHECK ---
 if "logged_in_prof" not in st.session_state or not st.session_state["logged_in_prof"]:
@@ -16,7 +16,7 @@ st.set_page_config(page_title="🤝 Collaboration Center", layout="wide")
 st.title("🤝 Collaboration Center")
 
 try:
-    db = PostgresHandler()
+    db = get_handler()
 except Exception as e:
     st.error(f"Database connection failed: {e}")
     st.stop()
@@ -1,9 +1,9 @@
 # File: pages/3_dashboard.py
+import io
+from concurrent.futures import wait
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from database.postgres_handler import PostgresHandler
-import unicodedata
+from database.tasks import share_result_async
 
 # --- Auth check ---
 if "logged_in_prof" not in st.session_state:
@@ -14,67 +14,43 @@ prof         = st.session_state["logged_in_prof"]
 professor_id = prof.get("professor", "")
 my_email     = prof.get("university_email", "")
 
-def clean(val):
-    if pd.isna(val) or str(val).strip().lower() in ["", "none", "unknown"]:
-        return "Unknown"
-    return val
-
-def normalize_text(val):
-    if not isinstance(val, str):
-        return ""
-    val = val.strip().lower()
-    val = unicodedata.normalize('NFKD', val)
-    return ''.join(c for c in val if not unicodedata.combining(c))
-
-def normalize_language(lang):
-    if not isinstance(lang, str):
-        return "Unknown"
-    lang = lang.strip().lower()
-    mapping = {
-        "english": "English", "en": "English",
-        "german":  "German",  "de": "German", "deutsch": "German",
-        "spanish": "Spanish","es": "Spanish","español": "Spanish"
-    }
-    return mapping.get(lang, lang.capitalize() if lang else "Unknown")
-
-def semester_sorter(sem):
+# Heavy imports only once we know the page will actually render.
+import numpy as np
+import pandas as pd
+from utils.dashboard_data import load_dashboard_df
+
+SEASON_ORDER = {"spring":0, "summer":1, "fall":2, "winter":3}
+
+def semester_sorter(sem: pd.Series) -> pd.Series:
+    """Sort key year*10 + season; unparseable semesters sort last."""
+    parts  = sem.astype(str).str.strip().str.lower().str.split()
+    season = parts.str[0].map(SEASON_ORDER).fillna(4)
+    year   = pd.to_numeric(parts.str[-1], errors="coerce")
+    return (year * 10 + season).fillna(999999)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _csv_bytes(df: pd.DataFrame) -> bytes:
+    # Arrow's native CSV writer (pyarrow ships with Streamlit); pandas' writer as fallback.
     try:
-        season_map = {"spring":0, "summer":1, "fall":2, "winter":3}
-        parts = sem.strip().split()
-        year = int(parts[-1])
-        season = season_map.get(parts[0].lower(), 4)
-        return year*10 + season
-    except:
-        return 999999
+        import pyarrow as pa, pyarrow.csv as pacsv
+        buf = io.BytesIO()
+        pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+        return buf.getvalue()
+    except (ImportError, NotImplementedError, TypeError, ValueError):
+        return df.to_csv(index=False).encode("utf-8")
 
 def main():
     st.set_page_config(page_title="📊 Analytics Dashboard", layout="wide")
     st.title("📈 Grading Analytics Dashboard")
 
-    handler   = PostgresHandler()
-
-    # 1️⃣ Fetch only this professor's results + those shared with them
-    my_df     = pd.DataFrame(handler.fetch_my_results(professor_id))
-    shared_df = pd.DataFrame(handler.fetch_shared_with_me(my_email))
-
-    # Tag ownership
-    if not my_df.empty:
-        my_df["__owner__"] = "You"
-    if not shared_df.empty:
-        shared_df["__owner__"] = "Shared"
-
-    # Merge
-    df = pd.concat([my_df, shared_df], ignore_index=True, sort=False)
+    df = load_dashboard_df(professor_id, my_email)
     if df.empty:
         st.warning("No grading data available (yours or shared).")
         return
+    import plotly.express as px
 
-    # 2️⃣ Clean & prepare fields
-    for col in ["course", "semester", "assignment_no", "student_id", "question"]:
-        df[col] = df[col].apply(clean)
-    df["language"] = df["language"].apply(normalize_language)
-    df["score"]    = pd.to_numeric(df["new_score"], errors="coerce").fillna(0)
-    df["semester"] = df["semester"].astype(str)
+    # Filter options come straight from the (already sorted, unique) categories; built once per run.
+    options = {c: ["All", *df[c].cat.categories.tolist()] for c in ["course", "semester", "assignment_no", "student_id", "language"]}
 
     # two tabs: My vs Shared
     tab_you, tab_shared = st.tabs(["My Results", "Shared With Me"])
@@ -87,25 +63,23 @@ def main():
 
             # 3️⃣ Sidebar filters
             st.sidebar.header("🔍 Filters")
-            opts = lambda c: ["All"] + sorted(df[c].unique())
-            selected_course     = st.sidebar.selectbox("Course", opts("course"), key=f"c_{owner_label}")
-            selected_semester   = st.sidebar.selectbox("Semester", opts("semester"), key=f"s_{owner_label}")
-            selected_assignment = st.sidebar.selectbox("Assignment", opts("assignment_no"), key=f"a_{owner_label}")
-            selected_student    = st.sidebar.selectbox("Student", opts("student_id"), key=f"st_{owner_label}")
-            selected_language   = st.sidebar.selectbox("Language", opts("language"), key=f"l_{owner_label}")
-
-            mask = pd.Series(True, index=sub.index)
-            for field, sel in [
-                ("course", selected_course),
-                ("semester", selected_semester),
-                ("assignment_no", selected_assignment),
-                ("student_id", selected_student),
-                ("language", selected_language),
-            ]:
-                if sel != "All":
-                    mask &= (sub[field] == sel)
-
-            filtered = sub[mask]
+            selected_course     = st.sidebar.selectbox("Course", options["course"], key=f"c_{owner_label}")
+            selected_semester   = st.sidebar.selectbox("Semester", options["semester"], key=f"s_{owner_label}")
+            selected_assignment = st.sidebar.selectbox("Assignment", options["assignment_no"], key=f"a_{owner_label}")
+            selected_student    = st.sidebar.selectbox("Student", options["student_id"], key=f"st_{owner_label}")
+            selected_language   = st.sidebar.selectbox("Language", options["language"], key=f"l_{owner_label}")
+
+            active = [
+                (field, sel) for field, sel in [
+                    ("course", selected_course),
+                    ("semester", selected_semester),
+                    ("assignment_no", selected_assignment),
+                    ("student_id", selected_student),
+                    ("language", selected_language),
+                ] if sel != "All"
+            ]
+            # One fused AND over the active filters only (category == scalar compares integer codes).
+            filtered = sub[np.logical_and.reduce([(sub[field] == sel).to_numpy() for field, sel in active])] if active else sub
             if filtered.empty:
                 st.warning("No data matches the selected filters.")
                 continue
@@ -126,14 +100,25 @@ def main():
                         st.error("Enter a valid email to share with.")
                     else:
                         ids_to_share = filtered["id"].astype(int).unique().tolist()
-                        for rid in ids_to_share:
-                            handler.share_result(my_email, target, rid)
-                        st.success(f"Shared {len(ids_to_share)} records with {target}.")
+                        # Shares run concurrently on the db-writer pool; wait for all of them so one
+                        # failure neither hides the others nor skips the cache refresh.
+                        futures = {share_result_async(my_email, target, rid): rid for rid in ids_to_share}
+                        done, _ = wait(futures)
+                        failed = {futures[fut]: fut.exception() for fut in done if fut.exception() is not None}
+                        load_dashboard_df.clear()
+                        shared = len(ids_to_share) - len(failed)
+                        if failed:
+                            st.warning(f"Shared {shared} records with {target}; {len(failed)} failed.")
+                            with st.expander("Failed shares"):
+                                for rid, exc in sorted(failed.items()):
+                                    st.write(f"Result {rid}: {exc}")
+                        else:
+                            st.success(f"Shared {shared} records with {target}.")
 
             # 5️⃣ Bar Chart: Avg Score by Course & Language
             st.subheader("1️⃣ Avg Score by Course & Language")
             bar_df = (
-                filtered.groupby(["course","language"])
+                filtered.groupby(["course","language"], observed=True)
                         .score.mean()
                         .reset_index(name="Avg Score")
             )
@@ -159,12 +144,11 @@ def main():
             # 7️⃣ Trend: Avg Score by Semester
             st.subheader("3️⃣ Trend: Avg Score by Semester")
             trend = (
-                filtered.groupby("semester", as_index=False)
+                filtered.groupby("semester", as_index=False, observed=True)
                         .score.mean()
                         .rename(columns={"score":"Avg Score"})
             )
-            trend["sort_key"] = trend["semester"].apply(semester_sorter)
-            trend = trend.sort_values("sort_key")
+            trend = trend.sort_values("semester", key=semester_sorter)
             fig_line = px.line(
                 trend, x="semester", y="Avg Score", markers=True,
                 labels={"semester":"Semester","Avg Score":"Avg Score"}
@@ -174,7 +158,7 @@ def main():
             # 8️⃣ Top & Bottom Performers
             st.subheader("4️⃣ Top & Bottom Performers")
             stud = (
-                filtered.groupby("student_id")
+                filtered.groupby("student_id", observed=True)
                         .agg({"score":["mean","count"]})
             )
             stud.columns = ["Avg Score","Submissions"]
@@ -189,7 +173,7 @@ def main():
 
             # 9️⃣ Questions Performance
             qdf = (
-                filtered.groupby("question")
+                filtered.groupby("question", observed=True)
                         .agg({"score":["mean","count"]})
             )
             qdf.columns = ["Avg Score","Attempts"]
@@ -213,7 +197,7 @@ def main():
 
             st.download_button(
                 "📅 Download CSV",
-                data=filtered.to_csv(index=False).encode("utf-8"),
+                data=_csv_bytes(filtered),
                 file_name=f"grading_data_{owner_label.lower()}.csv",
                 mime="text/csv"
             )
@@ -2,15 +2,18 @@
 # File: pages/3_fine_tuning.py
 
 import streamlit as st
-import json
+import os
 import sys
+import tempfile
 from pathlib import Path
 
 # Add project root to the Python path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.append(str(PROJECT_ROOT))
+TRAINING_DIR = PROJECT_ROOT / "training"
+TRAINING_DATA_PATH = TRAINING_DIR / "training_dataset.jsonl"
 
-from database.postgres_handler import PostgresHandler
+from database.postgres_handler import get_handler
 from utils.logger import logger
 
 # --- CONFIGURATION & CONSTANTS ---
@@ -35,6 +38,12 @@ and a grading rubric, provide a score and constructive feedback.
 {model_response}
 """
 
+# The same template as a Postgres format() string, so rows come back from the
+# database already rendered.
+SQL_PROMPT_FORMAT = PROMPT_TEMPLATE.replace("%", "%%").format(
+    question="%1$s", student_answer="%2$s", ideal_answer="%3$s", model_response="%4$s"
+)
+
 # The content of the Colab script to be displayed on the page.
 # Sourced from training/colab_finetune.py
 COLAB_SCRIPT_CONTENT = """
@@ -79,7 +88,7 @@ except Exception as e:
     sys.exit(1)
 
 # Step 3: Run the fine-tuning process
-import json, random
+import random
 print("\n⏳ Preparing dataset...")
 DATA_SOURCE_FILE = "training_dataset.jsonl"
 DATA_DIR = Path("./prepared_data")
@@ -89,7 +98,8 @@ if not Path(DATA_SOURCE_FILE).exists():
     print(f"❌ ERROR: Cannot find '{DATA_SOURCE_FILE}'. Please upload it first.")
     sys.exit(1)
 
-with open(DATA_SOURCE_FILE, 'r') as f: all_data = [json.loads(line) for line in f if line.strip()]
+# Lines are already JSON; split them as raw bytes instead of decoding, parsing and re-serializing each record.
+with open(DATA_SOURCE_FILE, 'rb') as f: all_data = [line.rstrip(b'\\n') + b'\\n' for line in f if line.strip()]
 
 if len(all_data) < 3:
     raise ValueError(f"Dataset must have at least 3 entries to create train/test/validation splits. Found {len(all_data)}.")
@@ -98,9 +108,8 @@ random.shuffle(all_data)
 # Split data: 1 for validation, 1 for test, rest for training
 valid_data, test_data, train_data = all_data[:1], all_data[1:2], all_data[2:]
 
-def write_jsonl(data, path):
-    with open(path, 'w') as f:
-        for item in data: f.write(json.dumps(item) + '\n')
+def write_jsonl(lines, path):
+    with open(path, 'wb') as f: f.writelines(lines)
 
 write_jsonl(train_data, DATA_DIR / "train.jsonl")
 write_jsonl(valid_data, DATA_DIR / "valid.jsonl")
@@ -114,16 +123,16 @@ ITERATIONS = 500
 BATCH_SIZE = 1
 NUM_LAYERS = 16
 
-cmd = (
-    f'python -m mlx_lm.lora '
-    f'--model {HUGGING_FACE_MODEL} --data "{DATA_DIR}" --train '
-    f'--batch-size {BATCH_SIZE} --iters {ITERATIONS} --num-layers {NUM_LAYERS} '
-    f'--adapter-path "{ADAPTER_PATH}"'
-)
-print(f"Executing command:\n{cmd}")
+cmd = [
+    sys.executable, "-m", "mlx_lm.lora",
+    "--model", HUGGING_FACE_MODEL, "--data", str(DATA_DIR), "--train",
+    "--batch-size", str(BATCH_SIZE), "--iters", str(ITERATIONS), "--num-layers", str(NUM_LAYERS),
+    "--adapter-path", str(ADAPTER_PATH),
+]
+print(f"Executing command:\n{' '.join(cmd)}")
 
 try:
-    with subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1) as proc:
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1) as proc:
         for line in proc.stdout: print(line, end='')
     if proc.returncode != 0: raise subprocess.CalledProcessError(proc.returncode, cmd)
 except subprocess.CalledProcessError as e:
@@ -145,72 +154,97 @@ else:
 
 def generate_training_data():
     """
-    Fetches corrected grading results from the database and formats them
-    into a JSONL string for fine-tuning.
+    Fetches corrected grading results from the database and writes them as
+    JSONL to TRAINING_DATA_PATH for fine-tuning. Returns (path, count).
     """
+    tmp_path = None
     try:
-        pg_handler = PostgresHandler()
+        pg_handler = get_handler()
         # This query selects only the records that have been manually corrected by a human.
-        # It now joins on course and assignment_no for improved accuracy.
+        # It joins on course and assignment_no for accuracy; the LATERAL lookup fetches one
+        # prof_data row per corrected result by index instead of de-duplicating all of prof_data.
+        # Postgres extracts the first text block of the answer, fills in the prompt template
+        # and returns the finished JSONL line, so Python only has to write it out. try_jsonb
+        # yields NULL for a malformed answer, which falls through to the placeholder text.
         query = """
         SELECT
-            gr.question,
-            gr.student_answer,
-            gr.new_feedback AS corrected_feedback,
-            pd.ideal_answer,
-            pd.rubric
+            jsonb_build_object('text', format(
+                %s,
+                gr.question,
+                CASE WHEN jsonb_typeof(sa.answer) = 'array'
+                     THEN COALESCE((SELECT b ->> 'content'
+                                      FROM jsonb_array_elements(sa.answer) AS b
+                                     WHERE b ->> 'type' = 'text'
+                                     LIMIT 1), '')
+                     ELSE 'No valid answer content found.'
+                END,
+                concat('Ideal Answer: ', pd.ideal_answer, E'\\nRubric: ', to_jsonb(pd.rubric)::text),
+                gr.new_feedback
+            ))::text AS jsonl_line
         FROM
             grading_results AS gr
-        JOIN
+        CROSS JOIN LATERAL
+            (SELECT try_jsonb(gr.student_answer) AS answer) AS sa
+        CROSS JOIN LATERAL
             (
-                SELECT DISTINCT course, assignment_no, question, ideal_answer, rubric
+                SELECT ideal_answer, rubric
                 FROM prof_data
+                WHERE question = gr.question
+                  AND course = gr.course
+                  AND assignment_no = gr.assignment_no
+                LIMIT 1
             ) AS pd
-        ON
-            gr.question = pd.question
-            AND gr.course = pd.course
-            AND gr.assignment_no = pd.assignment_no
         WHERE
             gr.new_feedback IS NOT NULL
-            AND gr.new_feedback != ''
-            AND gr.new_feedback != gr.old_feedback;
+            AND gr.new_feedback <> ''
+            AND gr.new_feedback <> gr.old_feedback;
         """
-        corrected_examples = pg_handler.execute_query(query, fetch="all")
-        logger.info(f"Found {len(corrected_examples)} corrected examples in the database.")
-
-        if not corrected_examples:
+        # Each row is a complete JSONL entry with the 'text' key the training script expects,
+        # so the whole file is piped out of Postgres with a single COPY straight to disk.
+        TRAINING_DIR.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", buffering=1 << 20, dir=TRAINING_DIR, suffix=".tmp", delete=False) as f:
+            tmp_path = f.name
+            pg_handler.copy_lines_to(query, (SQL_PROMPT_FORMAT,), f)
+        with open(tmp_path, "rb") as written:
+            count = sum(chunk.count(b"\n") for chunk in iter(lambda: written.read(1 << 20), b""))
+        logger.info(f"Found {count} corrected examples in the database.")
+
+        if not count:
             return None, 0
 
-        # Convert the data to the JSONL format with the required prompt structure.
-        jsonl_output = ""
-        for ex in corrected_examples:
-            # Reconstruct the "ideal answer" to include the rubric, as expected by the model.
-            ideal_answer_with_rubric = f"Ideal Answer: {ex['ideal_answer']}\nRubric: {json.dumps(ex['rubric'])}"
-            
-            # The student answer is stored as a JSON string of content blocks.
-            # We need to parse it and extract the text.
-            try:
-                answer_blocks = json.loads(ex['student_answer'])
-                student_text = next((block['content'] for block in answer_blocks if block['type'] == 'text'), "")
-            except (json.JSONDecodeError, TypeError):
-                student_text = "No valid answer content found."
-
-            # Format the final text prompt
-            text_prompt = PROMPT_TEMPLATE.format(
-                question=ex['question'],
-                student_answer=student_text,
-                ideal_answer=ideal_answer_with_rubric,
-                model_response=ex['corrected_feedback']
-            )
-            # Create a JSONL entry. The training script expects a 'text' key.
-            jsonl_output += json.dumps({"text": text_prompt}) + "\n"
-            
-        return jsonl_output, len(corrected_examples)
+        os.replace(tmp_path, TRAINING_DATA_PATH)  # atomic, so a concurrent download never sees a partial file
+        tmp_path = None
+        return TRAINING_DATA_PATH, count
 
     except Exception as e:
         logger.error(f"Error generating training data: {e}")
         st.error(f"An error occurred while generating training data: {e}")
         return None, 0
+    finally:
+        # The temp file holds student answers; never leave an empty or partial one behind.
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def training_data_token() -> tuple:
+    """
+    Cheap fingerprint of the corrected results (saving a correction bumps created_at),
+    used as the cache key for the generated training data. The short TTL bounds how long
+    a newly saved correction can go unnoticed.
+    """
+    row = get_handler().execute_query(
+        """
+        SELECT COUNT(*) AS n, MAX(created_at) AS last_change
+        FROM grading_results
+        WHERE new_feedback IS NOT NULL AND new_feedback <> '' AND new_feedback <> old_feedback;
+        """,
+        fetch="one"
+    )
+    return (row['n'], row['last_change'])
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def generate_training_data_cached(token: tuple):
+    return generate_training_data()
 
 # --- PAGE UI ---
 
@@ -234,21 +268,29 @@ st.markdown(
 
 if st.button("📦 Generate Training Data", key="generate_data"):
     with st.spinner("Querying database and preparing data..."):
-        jsonl_data, count = generate_training_data()
-        if jsonl_data and count > 0:
-            st.session_state['generated_training_data'] = jsonl_data
+        try:
+            jsonl_path, count = generate_training_data_cached(training_data_token())
+        except Exception as e:
+            logger.error(f"Error checking for new corrections: {e}")
+            jsonl_path, count = generate_training_data()
+        if not jsonl_path or not jsonl_path.exists():
+            generate_training_data_cached.clear()  # don't keep empty, failed or deleted results around
+            if jsonl_path: jsonl_path, count = generate_training_data()
+        if jsonl_path and count > 0:
+            st.session_state['generated_training_path'] = jsonl_path
             st.session_state['generated_training_count'] = count
             st.success(f"Successfully generated a training file with {count} corrected examples.")
         else:
             st.warning("No corrected examples found in the database. Please grade some answers and make corrections before trying to fine-tune.")
 
-if 'generated_training_data' in st.session_state:
-    st.download_button(
-        label="📥 Download training_dataset.jsonl",
-        data=st.session_state['generated_training_data'],
-        file_name="training_dataset.jsonl",
-        mime="application/jsonl"
-    )
+if st.session_state.get('generated_training_path') and st.session_state['generated_training_path'].exists():
+    with open(st.session_state['generated_training_path'], "rb") as jsonl_file:
+        st.download_button(
+            label="📥 Download training_dataset.jsonl",
+            data=jsonl_file,
+            file_name="training_dataset.jsonl",
+            mime="application/jsonl"
+        )
 
 st.markdown("---")
 
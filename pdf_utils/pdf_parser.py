@@ -1,11 +1,12 @@
 import fitz  # PyMuPDF
+import json
 import re
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import Dict, List, Any, Optional
 
 
 # --- Data model for downstream pipeline --------------------------------------
-@dataclass
+@dataclass(slots=True)
 class Block:
     q_id: str
     block_type: str           # 'question' | 'ideal' | 'rubric' | 'student'
@@ -19,8 +20,24 @@ class Block:
     page: int = 0
 
 
-MATH_PATTERN = re.compile(r"\$[^$]+\$|\\\([^\)]+\\\)|\\\[[^\]]+\\\]", re.MULTILINE)
-CODE_FENCE   = re.compile(r"```(\w+)?\n([\s\S]*?)```", re.MULTILINE)
+# Math ($...$, \(...\), \[...\]) and fenced code in one alternation, so each chunk is scanned once.
+TOKEN_RE = re.compile(
+    r"(?P<math>\$[^$]+\$|\\\([^\)]+\\\)|\\\[[^\]]+\\\])"
+    r"|(?P<code>```(?P<lang>\w+)?\n(?P<body>[\s\S]*?)```)",
+    re.MULTILINE
+)
+HEADER_RE = re.compile(r"(?mi)^(?:Q(?:uestion)?\s*\d+[:.)]|Aufgabe\s*\d+[:.)]|Frage\s*\d+[:.)])")
+# A student's first answer may sit on the student line itself ("Student 1: A1: ..."); later answers start a line.
+STUDENT_MARKER_RE = re.compile(
+    r"(?m)^(?:(?P<student>Student\s*\d+|Studierende[rn]?\s*\d+):(?:[^\n]*?(?P<inline>[AF]\d+):)?|(?P<answer>[AF]\d+):)"
+)
+SECTION_RE = re.compile(
+    r"(?mi)^(?:(?P<q>Q(?:uestion)?|Aufgabe)|(?P<i>Ideal\s*Answer)|(?P<r>Rubric))\s*(?P<num>\d+)\s*[:.)]"
+)
+
+# Plain-text extraction without ligature preservation: less work per glyph, and
+# "ﬁ"/"ﬂ" come out as plain letters that the header regexes can match.
+TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_LIGATURES
 
 
 def extract_text_from_pdf(pdf_file) -> str:
@@ -28,7 +45,14 @@ def extract_text_from_pdf(pdf_file) -> str:
     Extract raw text from uploaded PDF (file-like object).
     """
     doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-    return "\n".join(page.get_text("text") for page in doc)
+    try:
+        # Load one page at a time so each page's MuPDF objects can be freed before the next.
+        chunks: List[str] = [""] * doc.page_count
+        for pno in range(doc.page_count):
+            chunks[pno] = doc.load_page(pno).get_text("text", flags=TEXT_FLAGS)
+    finally:
+        doc.close()
+    return "\n".join(chunks)
 
 
 def extract_blocks_from_pdf(pdf_file) -> List[Block]:
@@ -37,41 +61,43 @@ def extract_blocks_from_pdf(pdf_file) -> List[Block]:
     detects inline/display LaTeX, and fenced code blocks.
     """
     doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+    try:
+        pages = [doc.load_page(pno).get_text("text", flags=TEXT_FLAGS) for pno in range(doc.page_count)]
+    finally:
+        doc.close()
+
     blocks: List[Block] = []
     qn = 0
 
-    for pno, page in enumerate(doc):
-        text = page.get_text("text")
+    for pno, text in enumerate(pages):
         if not text.strip():
             continue
 
         # Segment by common headers: Q1:, Question 1, Aufgabe 1, etc.
-        chunks = re.split(
-            r"(?mi)^(?:Q(?:uestion)?\s*\d+[:.)]|Aufgabe\s*\d+[:.)]|Frage\s*\d+[:.)])",
-            text
-        )
-
-        # If no obvious markers, treat page as one question chunk
-        if len(chunks) <= 1:
-            chunks = [text]
+        # Chunks are sliced between header matches; with no markers the page is one chunk.
+        headers = list(HEADER_RE.finditer(text))
+        starts = [0] + [m.end() for m in headers]
+        ends = [m.start() for m in headers] + [len(text)]
 
-        for chunk in chunks:
-            c = chunk.strip()
+        for start, end in zip(starts, ends):
+            c = text[start:end].strip()
             if not c:
                 continue
 
             qn += 1
             qid = f"Q{qn}"
 
-            latex = [m.group(0) for m in MATH_PATTERN.finditer(c)]
-            code_m = list(CODE_FENCE.finditer(c))
+            latex: List[str] = []
             code = None
+            for m in TOKEN_RE.finditer(c):
+                if m.lastgroup == "math":
+                    latex.append(m.group(0))
+                elif code is None:
+                    code = {"lang": (m.group("lang") or "text").lower(), "content": m.group("body")}
             modality = ["text"]
             if latex:
                 modality.append("math")
-            if code_m:
-                lang = (code_m[0].group(1) or "text").lower()
-                code = {"lang": lang, "content": code_m[0].group(2)}
+            if code:
                 modality.append("code")
 
             blocks.append(
@@ -99,39 +125,24 @@ def parse_professor_pdf(text: str) -> Dict[str, Any]:
       "rubrics":   { "Q1": { ... }, ... }
     }
     """
-    # Extract "sequence" sections if present
-    seq_sections = re.split(r"(?mi)^(?:Questions?|Aufgaben)\s*:\s*$", text)
     questions: Dict[str, str] = {}
     ideals: Dict[str, str] = {}
     rubrics: Dict[str, Any] = {}
 
-    # Questions
-    q_matches = re.finditer(
-        r"(?mi)^(?:Q(?:uestion)?|Aufgabe)\s*(\d+)\s*[:.)]\s*(.*?)(?=^(?:Q(?:uestion)?|Aufgabe)\s*\d+|^Ideal\s*Answer|^Rubric|$)",
-        text, re.S | re.M
-    )
-    for m in q_matches:
-        questions[f"Q{m.group(1)}"] = m.group(2).strip()
-
-    # Ideals
-    i_matches = re.finditer(
-        r"(?mi)^Ideal\s*Answer\s*(\d+)\s*[:.)]\s*(.*?)(?=^Ideal\s*Answer|^Rubric|$)",
-        text, re.S | re.M
-    )
-    for m in i_matches:
-        ideals[f"Q{m.group(1)}"] = m.group(2).strip()
+    # One scan for every section header; each body runs up to the next header.
+    matches = list(SECTION_RE.finditer(text))
+    raw_rubrics: Dict[str, str] = {}
+    for m, nxt in zip(matches, matches[1:] + [None]):
+        key = f"Q{m.group('num')}"
+        body = text[m.end():nxt.start() if nxt else len(text)].strip()
+        section = questions if m.group("q") else ideals if m.group("i") else raw_rubrics
+        section[key] = body
 
     # Rubrics: allow inline JSON or bullet lists; keep raw text if not JSON
-    r_matches = re.finditer(
-        r"(?mi)^Rubric\s*(\d+)\s*[:.)]\s*(.*?)(?=^Rubric|$)",
-        text, re.S | re.M
-    )
-    for m in r_matches:
-        raw = m.group(2).strip()
+    for key, raw in raw_rubrics.items():
         cleaned = raw
         try:
-            import json
-            rubrics[f"Q{m.group(1)}"] = json.loads(raw)
+            rubrics[key] = json.loads(raw)
         except Exception:
             # Simple bullet -> JSON conversion (• item (n points))
             lines = [ln.strip("-• ").strip() for ln in cleaned.splitlines() if ln.strip()]
@@ -139,7 +150,7 @@ def parse_professor_pdf(text: str) -> Dict[str, Any]:
             for ln in lines:
                 pts = re.search(r"(\d+(?:\.\d+)?)\s*(?:pts?|points?)", ln, re.I)
                 criteria.append({"id": ln, "points": float(pts.group(1)) if pts else 1.0})
-            rubrics[f"Q{m.group(1)}"] = {"criteria": criteria}
+            rubrics[key] = {"criteria": criteria}
 
     return {"questions": questions, "ideals": ideals, "rubrics": rubrics}
 
@@ -159,16 +170,37 @@ def parse_student_pdf(text: str) -> Dict[str, Dict[str, str]]:
     Returns: { "Student 1": { "A1": "...", "A2": "..." }, ... }
     """
     students: Dict[str, Dict[str, str]] = {}
-    parts = re.split(r'(?m)^(Student\s*\d+:|Studierende[rn]?\s*\d+:)', text)
-    for i in range(1, len(parts), 2):
-        label = parts[i].rstrip(':').strip()
-        block = parts[i + 1]
-        answers: Dict[str, str] = {}
-        for m in re.finditer(r'(A\d+|F\d+):\s*(.*?)(?=\nA\d+:|\nF\d+:|\nStudent\s*\d+:|\nStudierende[rn]?\s*\d+:|$)', block, re.S):
-            answers[m.group(1)] = m.group(2).strip()
-        students[label] = answers
+    answers: Optional[Dict[str, str]] = None
+    open_key, start = None, 0
+    # One pass over all student/answer markers; each answer runs until the next marker.
+    for m in STUDENT_MARKER_RE.finditer(text):
+        if open_key:
+            answers[open_key] = text[start:m.start()].strip()
+        if m.group("student"):
+            answers = students[m.group("student").strip()] = {}
+            open_key = m.group("inline")
+        else:
+            open_key = m.group("answer") if answers is not None else None
+        start = m.end()
+    if open_key:
+        answers[open_key] = text[start:].strip()
     return students
 
 
 def blocks_to_json(blocks: List[Block]) -> List[Dict[str, Any]]:
-    return [asdict(b) for b in blocks]
+    # Shallow per-field dicts: asdict() deep-copies every nested list for no benefit here.
+    return [
+        {
+            "q_id": b.q_id,
+            "block_type": b.block_type,
+            "modality": b.modality,
+            "text": b.text,
+            "latex": b.latex,
+            "code": b.code,
+            "tables": b.tables,
+            "images": b.images,
+            "bbox": b.bbox,
+            "page": b.page,
+        }
+        for b in blocks
+    ]
@@ -0,0 +1,77 @@
+# tests/test_grading_helpers.py
+import pytest
+
+import utils.grading
+from utils.grading import align_to_rubric, dedupe_feedback, item_signature
+
+RUBRIC = [
+    {"criteria": "Correctness", "points": 5},
+    {"criteria": "Clarity of explanation", "points": 3},
+]
+
+
+def test_align_exact_match_after_normalization():
+    model = [{"criteria": "  CLARITY   of explanation ", "score": 2}, {"criteria": "correctness", "score": "4.6"}]
+    assert align_to_rubric(RUBRIC, model, 7) == [
+        {"criteria": "Correctness", "score": 5},
+        {"criteria": "Clarity of explanation", "score": 2},
+    ]
+
+
+@pytest.mark.parametrize("use_rapidfuzz", [True, False])
+def test_align_fuzzy_match_and_clamping(monkeypatch, use_rapidfuzz):
+    if use_rapidfuzz:
+        pytest.importorskip("rapidfuzz")
+    else:
+        monkeypatch.setattr(utils.grading, "fuzz_process", None)  # difflib fallback
+    model = [{"criteria": "Corectness", "score": 9}, {"criteria": "Clarity of explanations", "score": -1}]
+    assert align_to_rubric(RUBRIC, model, 8) == [
+        {"criteria": "Correctness", "score": 5},
+        {"criteria": "Clarity of explanation", "score": 0},
+    ]
+
+
+def test_align_unmatched_and_bad_scores_are_zero():
+    model = [{"criteria": "Something unrelated", "score": 3}, {"criteria": "Correctness", "score": "n/a"}]
+    assert align_to_rubric(RUBRIC, model, 3) == [
+        {"criteria": "Correctness", "score": 0},
+        {"criteria": "Clarity of explanation", "score": 0},
+    ]
+
+
+def test_align_empty_inputs():
+    assert align_to_rubric([], [{"criteria": "x", "score": 1}], 1) == []
+    assert align_to_rubric(RUBRIC, None, 0) == [
+        {"criteria": "Correctness", "score": 0},
+        {"criteria": "Clarity of explanation", "score": 0},
+    ]
+
+
+def test_dedupe_feedback_keeps_first_of_each_normalized_line():
+    text = "Good structure.\n\n  good STRUCTURE!  \nMissing an example.\nGood structure\n"
+    assert dedupe_feedback(text) == "Good structure.\nMissing an example."
+
+
+def test_dedupe_feedback_empty():
+    assert dedupe_feedback("") == ""
+    assert dedupe_feedback(None) == ""
+
+
+QUESTION = {"question": "Explain recursion.", "ideal_answer": "A function calling itself.", "rubric": RUBRIC}
+GRADER = {"grader": [1, "prompt-hash"], "model": "mistral"}
+
+
+def test_item_signature_ignores_whitespace_in_text_blocks():
+    a = [{"type": "text", "content": "A function\n  that calls   itself. "}]
+    b = [{"type": "text", "content": "A function that calls itself."}]
+    assert item_signature(QUESTION, a, [], "English", GRADER) == item_signature(QUESTION, b, [], "English", GRADER)
+
+
+def test_item_signature_changes_with_inputs_and_grader():
+    answer = [{"type": "text", "content": "A function that calls itself."}, {"type": "image", "content": b"\x89PNG"}]
+    base = item_signature(QUESTION, answer, [], "English", GRADER)
+    assert item_signature(QUESTION, answer, [], "German", GRADER) != base
+    assert item_signature(QUESTION, answer[:1], [], "English", GRADER) != base
+    assert item_signature(QUESTION, answer, [{"content": "ctx"}], "English", GRADER) != base
+    assert item_signature(QUESTION, answer, [], "English", {**GRADER, "grader": [2, "prompt-hash"]}) != base
+    assert item_signature(QUESTION, answer, [], "English", {**GRADER, "grader": [1, "other-prompt"]}) != base
@@ -0,0 +1,61 @@
+# tests/test_pdf_parser.py
+import pytest
+
+pytest.importorskip("fitz")
+from pdf_utils.pdf_parser import parse_professor_pdf, parse_student_pdf
+
+
+def test_student_pdf_answers_on_separate_lines():
+    text = (
+        "Student 1:\n"
+        "A1: first answer\n"
+        "spanning two lines\n"
+        "A2: second answer\n"
+        "\n"
+        "Studierender 2:\n"
+        "A1: erste Antwort\n"
+        "F2: zweite Antwort\n"
+    )
+    assert parse_student_pdf(text) == {
+        "Student 1": {"A1": "first answer\nspanning two lines", "A2": "second answer"},
+        "Studierender 2": {"A1": "erste Antwort", "F2": "zweite Antwort"},
+    }
+
+
+def test_student_pdf_first_answer_on_student_line():
+    text = "Student 1: A1: inline answer\nA2: next line\nStudent 2: Jane Doe A1: after a name\n"
+    assert parse_student_pdf(text) == {
+        "Student 1": {"A1": "inline answer", "A2": "next line"},
+        "Student 2": {"A1": "after a name"},
+    }
+
+
+def test_student_pdf_marker_text_inside_answer_is_kept():
+    text = "Student 1:\nA1: see A3: for details\nA2: done"
+    assert parse_student_pdf(text) == {"Student 1": {"A1": "see A3: for details", "A2": "done"}}
+
+
+def test_student_pdf_ignores_answers_before_first_student():
+    text = "A1: orphan\nStudent 1:\n\nStudent 2:\nA1: kept"
+    assert parse_student_pdf(text) == {"Student 1": {}, "Student 2": {"A1": "kept"}}
+
+
+def test_professor_pdf_sections_and_rubrics():
+    text = (
+        "Question 1: What is 2+2?\n"
+        "Ideal Answer 1: 4\n"
+        'Rubric 1: [{"criteria": "Correct", "points": 2}]\n'
+        "Aufgabe 2) Explain recursion.\n"
+        "Ideal Answer 2: A function calling itself.\n"
+        "Rubric 2:\n"
+        "- Definition (2 points)\n"
+        "- Example\n"
+    )
+    parsed = parse_professor_pdf(text)
+    assert parsed["questions"] == {"Q1": "What is 2+2?", "Q2": "Explain recursion."}
+    assert parsed["ideals"] == {"Q1": "4", "Q2": "A function calling itself."}
+    assert parsed["rubrics"]["Q1"] == [{"criteria": "Correct", "points": 2}]
+    assert parsed["rubrics"]["Q2"] == {"criteria": [
+        {"id": "Definition (2 points)", "points": 2.0},
+        {"id": "Example", "points": 1.0},
+    ]}
@@ -0,0 +1,74 @@
+# tests/test_postgres_handler.py
+import threading
+
+import pytest
+
+pytest.importorskip("psycopg2")
+import database.postgres_handler as pg
+from database.postgres_handler import PostgresHandler
+
+
+class _FakeCursor:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+
+class _FakeConn:
+    closed = 0
+    def cursor(self, *args, **kwargs): return _FakeCursor()
+    def commit(self): pass
+    def rollback(self): pass
+
+
+class _FakePool:
+    def getconn(self): return _FakeConn()
+    def putconn(self, conn): pass
+
+
+def _row(student_id, question, score):
+    return dict(student_id=student_id, professor_id="prof", course="C1", semester="WS24", assignment_no="1",
+                question=question, student_answer="[]", language="English", old_score=score, new_score=score,
+                old_feedback="fb", new_feedback="fb")
+
+
+def test_bulk_upsert_returns_ids_in_input_order(monkeypatch):
+    sent = []
+
+    def fake_execute_values(cur, sql, argslist, page_size, fetch):
+        sent.extend(argslist)
+        # Postgres does not promise RETURNING order; hand the ids back reversed.
+        returned = [(100 + i, a[0], a[4], a[5]) for i, a in enumerate(argslist)]
+        return returned[::-1]
+
+    monkeypatch.setattr(pg, "execute_values", fake_execute_values)
+    monkeypatch.setattr(PostgresHandler, "_pool", _FakePool())
+    handler = PostgresHandler.__new__(PostgresHandler)  # skip pool creation and schema setup
+    handler._local = threading.local()
+
+    rows = [_row("s1", "Q1", 1), _row("s2", "Q1", 2), _row("s1", "Q2", 3), _row("s1", "Q1", 4)]
+    ids = handler.bulk_insert_or_update_grading_results(rows)
+
+    # The duplicate (s1, Q1) key is sent once, with the last row's values, and both positions get its id.
+    assert len(sent) == 3
+    assert [a[9] for a in sent if a[0] == "s1" and a[5] == "Q1"] == [4]
+    assert ids == [100, 101, 102, 100]
+
+
+def test_bulk_upsert_maps_non_str_keys(monkeypatch):
+    def fake_execute_values(cur, sql, argslist, page_size, fetch):
+        # VARCHAR key columns come back from Postgres as str whatever Python type was sent.
+        return [(200 + i, str(a[0]), str(a[4]), str(a[5])) for i, a in enumerate(argslist)]
+
+    monkeypatch.setattr(pg, "execute_values", fake_execute_values)
+    monkeypatch.setattr(PostgresHandler, "_pool", _FakePool())
+    handler = PostgresHandler.__new__(PostgresHandler)
+    handler._local = threading.local()
+
+    rows = [dict(_row(12345, "Q1", 1), assignment_no=3), dict(_row("12345", "Q1", 2), assignment_no="3")]
+    # Both rows name the same database key, so they collapse to one upsert and share its id.
+    assert handler.bulk_insert_or_update_grading_results(rows) == [200, 200]
+
+
+def test_bulk_upsert_empty_is_noop():
+    handler = PostgresHandler.__new__(PostgresHandler)
+    assert handler.bulk_insert_or_update_grading_results([]) == []
@@ -0,0 +1,56 @@
+# File: utils/dashboard_data.py
+"""
+Cached loader for the dashboard's results frame. It lives outside the page so other
+pages that change grading results can invalidate just this cache with
+load_dashboard_df.clear() instead of clearing every st.cache_data cache.
+"""
+import pandas as pd
+import streamlit as st
+
+from database.postgres_handler import get_handler
+
+LANGUAGE_MAP = {
+    "english": "English", "en": "English",
+    "german":  "German",  "de": "German", "deutsch": "German",
+    "spanish": "Spanish","es": "Spanish","español": "Spanish"
+}
+
+def clean(col: pd.Series) -> pd.Series:
+    blank = col.isna() | col.astype("string").str.strip().str.lower().isin(["", "none", "unknown"])
+    return col.mask(blank, "Unknown")
+
+def normalize_language(col: pd.Series) -> pd.Series:
+    lang = col.astype("string").str.strip().str.lower()
+    out  = lang.map(LANGUAGE_MAP).fillna(lang.str.capitalize())
+    return out.where(out.fillna("") != "", "Unknown")
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_dashboard_df(professor_id: str, my_email: str) -> pd.DataFrame:
+    """Fetch, merge and clean the owned + shared results; cached so filter changes don't re-query."""
+    handler   = get_handler()
+
+    # 1️⃣ Fetch only this professor's results + those shared with them
+    my_df     = pd.DataFrame(handler.fetch_my_results(professor_id))
+    shared_df = pd.DataFrame(handler.fetch_shared_with_me(my_email))
+
+    # Tag ownership
+    if not my_df.empty:
+        my_df["__owner__"] = "You"
+    if not shared_df.empty:
+        shared_df["__owner__"] = "Shared"
+
+    # Merge
+    df = pd.concat([my_df, shared_df], ignore_index=True, sort=False)
+    if df.empty:
+        return df
+
+    # 2️⃣ Clean & prepare fields
+    for col in ["course", "semester", "assignment_no", "student_id", "question"]:
+        df[col] = clean(df[col])
+    df["language"] = normalize_language(df["language"])
+    df["score"]    = pd.to_numeric(df["new_score"], errors="coerce").fillna(0).astype("float32")
+    df["semester"] = df["semester"].astype(str)
+    # Low-cardinality labels as categories: smaller frames and integer-code groupbys.
+    for col in ["course", "semester", "assignment_no", "student_id", "question", "language", "__owner__"]:
+        df[col] = df[col].astype("category")
+    return df
@@ -0,0 +1,68 @@
+# File: utils/grading.py
+"""
+Pure helpers for the grading results page: rubric alignment of model scores,
+feedback de-duplication and the content hash used as the llm_cache key.
+"""
+import re
+import difflib
+import hashlib
+from typing import List, Dict, Any
+
+import orjson
+try: from rapidfuzz import process as fuzz_process, fuzz
+except ImportError: fuzz_process = None  # falls back to difflib
+
+_WS = re.compile(r"\s+")
+_NL = re.compile(r"\n+")
+_NONWORD = re.compile(r"\W+")
+
+def normalize_criteria(s: str) -> str:
+    return _WS.sub(" ", (s or "").strip().lower())
+
+def align_to_rubric(rubric_list: List[Dict], model_breakdown: List[Dict], model_total: int, fuzzy_cutoff: float=0.6) -> List[Dict]:
+    if not rubric_list: return []
+    mm = {}
+    for it in (model_breakdown or []):
+        k = normalize_criteria(it.get("criteria", ""))
+        try: sc = int(round(float(it.get("score", 0))))
+        except (ValueError, TypeError): sc = 0
+        if k: mm[k]=sc
+    aligned, keys = [], None
+    for r in rubric_list:
+        crit, pts = r.get("criteria", ""), int(r.get("points", 0)); norm = normalize_criteria(crit)
+        sc = mm.get(norm)
+        if sc is None and mm:
+            # Fuzzy matching only on a miss; exact criteria names are the common case.
+            if keys is None: keys = tuple(mm)
+            if fuzz_process is not None:
+                best = fuzz_process.extractOne(norm, keys, scorer=fuzz.ratio, score_cutoff=fuzzy_cutoff * 100)
+                sc = mm[best[0]] if best else 0
+            else:
+                close = difflib.get_close_matches(norm, keys, n=1, cutoff=fuzzy_cutoff)
+                sc = mm.get(close[0], 0) if close else 0
+        aligned.append({"criteria": crit, "score": max(0, min(sc or 0, pts))})
+    return aligned
+
+def dedupe_feedback(text: str) -> str:
+    # First line per normalized key wins; dicts keep insertion order.
+    seen = {}
+    for ln in _NL.split(text or ""):
+        ln = ln.strip()
+        if ln: seen.setdefault(_NONWORD.sub(" ", ln.lower()).strip(), ln)
+    return "\n".join(seen.values())
+
+def bytes_default(data: Any) -> str:
+    # orjson fallback for raw image bytes: store a content hash instead of the payload
+    if isinstance(data, (bytes, bytearray, memoryview)): return f"<bytes_hash:{hashlib.sha256(data).hexdigest()}>"
+    raise TypeError(f"Type is not JSON serializable: {type(data).__name__}")
+
+def item_signature(q: Dict, stud_ans: List[Dict], ctx_items: List[Dict], language: str, grader: Dict[str, Any]) -> str:
+    """Content hash of everything that feeds one LLM grading call; key for the persistent llm_cache.
+    grader identifies the model/prompt/version doing the grading, so changing any of them changes the key.
+    Whitespace in text blocks is collapsed so copy-pasted answers share a key."""
+    answer = [{**b, "content": _WS.sub(" ", b["content"]).strip()} if b.get("type") == "text" and isinstance(b.get("content"), str) else b
+              for b in stud_ans]
+    payload = {**grader, "question": q["question"], "ideal": q["ideal_answer"], "rubric": q.get("rubric", []),
+               "answer": answer, "context": [c.get("content") for c in ctx_items], "lang": language}
+    return hashlib.sha256(orjson.dumps(payload, default=bytes_default, option=orjson.OPT_SORT_KEYS)).hexdigest()
+